@@ -2,6 +2,10 @@ import pandas as pd
 import spacy
 import networkx as nx
 import matplotlib.pyplot as plt
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+from array import array
 import re
 import os
 import json
@@ -69,6 +73,267 @@ def extract_triples(text):
             
     return triples
 
+class SparseKnowledgeGraph:
+    """
+    Directed knowledge graph stored as integer-id sparse matrices instead of
+    per-node Python objects. Node i is names[i]; `adjacency` holds one entry per
+    (source, target) pair and `edge_labels` holds the matching label id + 1.
+    """
+
+    def __init__(self, names, is_paper, src, dst, label_ids, label_names):
+        self.names = names
+        self.is_paper = np.asarray(is_paper, dtype=bool)
+        self.label_names = label_names
+        n = len(names)
+
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        label_ids = np.asarray(label_ids, dtype=np.int64)
+
+        # A DiGraph keeps one edge per (u, v) and the last label written wins.
+        keys = src * n + dst
+        _, last = np.unique(keys[::-1], return_index=True)
+        keep = len(keys) - 1 - last
+        self.src, self.dst, self.labels = src[keep], dst[keep], label_ids[keep]
+
+        shape = (n, n)
+        self.adjacency = sp.csr_matrix(
+            (np.ones(len(self.src), dtype=np.float64), (self.src, self.dst)), shape=shape)
+        self.edge_labels = sp.csr_matrix(
+            (self.labels + 1, (self.src, self.dst)), shape=shape)
+
+    @property
+    def num_nodes(self):
+        return len(self.names)
+
+    @property
+    def num_edges(self):
+        return len(self.src)
+
+    def out_degree(self):
+        return np.diff(self.adjacency.indptr)
+
+    def in_degree(self):
+        return np.bincount(self.dst, minlength=self.num_nodes)
+
+    def degree(self):
+        # Same convention as networkx: a self-loop counts twice.
+        return self.out_degree() + self.in_degree()
+
+    def degree_by_label(self):
+        """
+        Sparse (num_nodes x num_labels) matrix of in+out degree per edge label.
+        """
+        rows = np.concatenate([self.src, self.dst])
+        cols = np.concatenate([self.labels, self.labels])
+        return sp.csr_matrix(
+            (np.ones(len(rows), dtype=np.int64), (rows, cols)),
+            shape=(self.num_nodes, len(self.label_names)))
+
+    def undirected_adjacency(self):
+        """Binary symmetric adjacency: one entry per connected pair, either direction."""
+        sym = (self.adjacency + self.adjacency.T).tocsr()
+        sym.data[:] = 1.0
+        return sym
+
+    def pagerank(self, alpha=0.85, max_iter=100, tol=1.0e-6, undirected=False):
+        """
+        Power-iteration PageRank on the adjacency matrix, with dangling nodes
+        redistributing their rank uniformly (matches nx.pagerank defaults).
+        With undirected=True it runs on the symmetrized graph, which matches
+        nx.pagerank(G.to_undirected()).
+        """
+        n = self.num_nodes
+        if n == 0:
+            return np.zeros(0)
+        matrix = self.undirected_adjacency() if undirected else self.adjacency
+        out = np.diff(matrix.indptr).astype(np.float64)
+        dangling = out == 0
+        inv_out = np.divide(1.0, out, out=np.zeros(n), where=~dangling)
+        transition_t = matrix.T.tocsr()
+
+        x = np.full(n, 1.0 / n)
+        for _ in range(max_iter):
+            x_prev = x
+            x = alpha * (transition_t @ (x_prev * inv_out))
+            x += (alpha * x_prev[dangling].sum() + (1.0 - alpha)) / n
+            if np.abs(x - x_prev).sum() < n * tol:
+                break
+        return x
+
+    def components(self):
+        """Weakly connected component id per node."""
+        _, labels = connected_components(self.adjacency, directed=True, connection="weak")
+        return labels
+
+    def communities(self, max_iter=100, seed=42):
+        """
+        Community id per node via semi-synchronous label propagation
+        (Cordasco & Gargano) on the undirected graph. Prints a warning if
+        max_iter sweeps pass without convergence.
+        """
+        labels, _, converged = self._label_propagation(max_iter, seed)
+        if not converged:
+            print(f"  -> Warning: label propagation did not converge in {max_iter} sweeps.")
+        return np.unique(labels, return_inverse=True)[1]
+
+    def _label_propagation(self, max_iter, seed):
+        """
+        Nodes are split into colour classes with no edges inside a class, and
+        each sweep updates one class at a time. Within a class every node takes
+        the most frequent label among its neighbours at once, via one sparse
+        (class nodes x labels) count matrix; a node keeps its label if it is
+        among the most frequent, other ties are broken at random. Updating
+        non-adjacent nodes together avoids the oscillation of fully synchronous
+        propagation on bipartite paper -> entity structure and guarantees
+        convergence. Returns (labels, sweeps, converged).
+        """
+        n = self.num_nodes
+        labels = np.arange(n)
+        if n == 0:
+            return labels, 0, True
+        undirected = self.undirected_adjacency()
+        undirected.setdiag(0)
+        undirected.eliminate_zeros()
+        rng = np.random.default_rng(seed)
+
+        colour = _colour_classes(undirected, rng)
+        classes = []
+        for nodes in np.split(np.argsort(colour, kind='stable'),
+                              np.cumsum(np.bincount(colour))[:-1]):
+            block = undirected[nodes]
+            if block.nnz == 0:
+                continue
+            local_rows = np.repeat(np.arange(len(nodes)), np.diff(block.indptr))
+            classes.append((nodes, local_rows, block.indices))
+
+        for sweep in range(1, max_iter + 1):
+            changed = 0
+            for nodes, local_rows, neighbours in classes:
+                changed += _adopt_majority_labels(labels, nodes, local_rows, neighbours, rng)
+            if changed == 0:
+                return labels, sweep, True
+        return labels, max_iter, False
+
+    def subgraph(self, nodes):
+        """Small networkx DiGraph induced by `nodes`, used for drawing only."""
+        nodes = np.asarray(nodes)
+        edge_labels = self.edge_labels[nodes][:, nodes].tocoo()
+        H = nx.DiGraph()
+        for i in nodes:
+            H.add_node(self.names[i], type='paper' if self.is_paper[i] else 'entity')
+        for r, c, lab in zip(edge_labels.row, edge_labels.col, edge_labels.data):
+            H.add_edge(self.names[nodes[r]], self.names[nodes[c]], label=self.label_names[lab - 1])
+        return H
+
+
+def _colour_classes(undirected, rng):
+    """
+    Colour the graph so adjacent nodes never share a colour. Each round, the
+    uncoloured nodes whose random priority beats every uncoloured neighbour
+    form an independent set and get the next colour (Jones-Plassmann style).
+    """
+    n = undirected.shape[0]
+    priority = rng.permutation(n)
+    colour = np.full(n, -1, dtype=np.int64)
+    remaining = np.arange(n)
+    sub = undirected
+    c = 0
+    while len(remaining):
+        p = priority[remaining]
+        neighbour_max = np.full(len(remaining), -1)
+        nonempty = np.diff(sub.indptr) > 0
+        if sub.nnz:
+            neighbour_max[nonempty] = np.maximum.reduceat(
+                p[sub.indices], sub.indptr[:-1][nonempty])
+        winners = p > neighbour_max
+        colour[remaining[winners]] = c
+        c += 1
+        keep = ~winners
+        remaining = remaining[keep]
+        sub = sub[keep][:, keep]
+    return colour
+
+
+def _adopt_majority_labels(labels, nodes, local_rows, neighbours, rng):
+    """
+    Move each node of one colour class to its most frequent neighbour label,
+    in place. Returns the number of nodes whose label changed.
+    """
+    m = len(nodes)
+    votes = sp.csr_matrix(
+        (np.ones(len(neighbours)), (local_rows, labels[neighbours])),
+        shape=(m, len(labels)))
+    counts = np.diff(votes.indptr)
+    entry_row = np.repeat(np.arange(m), counts)
+    has_votes = counts > 0
+    row_max = np.zeros(m)
+    row_max[has_votes] = np.maximum.reduceat(votes.data, votes.indptr[:-1][has_votes])
+    best = votes.data == row_max[entry_row]
+
+    current = labels[nodes]
+    keep = np.zeros(m, dtype=bool)
+    keep[entry_row[best & (votes.indices == current[entry_row])]] = True
+    move = has_votes & ~keep
+    if not move.any():
+        return 0
+
+    # Random tie-break among the best labels: highest random key per row.
+    candidates = best & move[entry_row]
+    rows = entry_row[candidates]
+    choices = votes.indices[candidates]
+    order = np.lexsort((rng.random(len(rows)), rows))
+    rows, choices = rows[order], choices[order]
+    last = np.r_[rows[1:] != rows[:-1], True]
+    labels[nodes[rows[last]]] = choices[last]
+    return int(last.sum())
+
+
+def build_sparse_graph(paper_titles, paper_triples):
+    """
+    Assembles the combined graph straight from the per-paper triple lists into
+    integer-id edge arrays, then into a SparseKnowledgeGraph.
+    """
+    node_ids = {}
+    names = []
+    is_paper = []
+    label_ids = {}
+    label_names = []
+    src, dst, labels = array('q'), array('q'), array('q')
+
+    def node_id(name, paper):
+        idx = node_ids.get(name)
+        if idx is None:
+            idx = node_ids[name] = len(names)
+            names.append(name)
+            is_paper.append(paper)
+        else:
+            is_paper[idx] = paper
+        return idx
+
+    def label_id(label):
+        idx = label_ids.get(label)
+        if idx is None:
+            idx = label_ids[label] = len(label_names)
+            label_names.append(label)
+        return idx
+
+    mentions = label_id('mentions')
+    for title, triples in zip(paper_titles, paper_triples):
+        # Shorten paper titles for cleaner node labels in the graph
+        paper = node_id(f"Paper: {title[:50]}...", True)
+        for subj, pred, obj in triples:
+            s = node_id(subj, False)
+            o = node_id(obj, False)
+            src.append(s)
+            dst.append(o)
+            labels.append(label_id(pred))
+            src.append(paper)
+            dst.append(s)
+            labels.append(mentions)
+
+    return SparseKnowledgeGraph(names, is_paper, src, dst, labels, label_names)
+
 def main():
     """
     Main function to orchestrate loading data, extracting knowledge, and
@@ -100,34 +365,30 @@ def main():
     df['triples'] = df['text_to_analyze'].apply(extract_triples)
     
     # --- 3. Build a Single Combined Graph ---
-    print("Building a single graph from all extracted triples...")
-    G = nx.DiGraph()
-    for index, row in df.iterrows():
-        # Shorten paper titles for cleaner node labels in the graph
-        paper_title = f"Paper: {row['Title'][:50]}..."
-        triples = row['triples']
-        
-        # Add the paper itself as a node
-        G.add_node(paper_title, type='paper')
+    print("Building a single sparse graph from all extracted triples...")
+    graph = build_sparse_graph(df['Title'].astype(str), df['triples'])
 
-        for subj, pred, obj in triples:
-            # Add entity nodes and link them to the paper
-            G.add_node(subj, type='entity')
-            G.add_node(obj, type='entity')
-            G.add_edge(subj, obj, label=pred)
-            G.add_edge(paper_title, subj, label='mentions')
+    print(f"  -> Full graph built with {graph.num_nodes} nodes and {graph.num_edges} edges.")
 
-    print(f"  -> Full graph built with {G.number_of_nodes()} nodes and {G.number_of_edges()} edges.")
+    # --- 3.a Graph Analytics ---
+    print("Computing PageRank, components and communities...")
+    # Rank on the symmetrized graph: papers only have outgoing 'mentions'
+    # edges, so directed PageRank would give every paper the minimum score.
+    pagerank = graph.pagerank(undirected=True)
+    label_degrees = graph.degree_by_label()
+    components = graph.components()
+    communities = graph.communities()
+    print(f"  -> {components.max() + 1 if graph.num_nodes else 0} connected components, "
+          f"{communities.max() + 1 if graph.num_nodes else 0} communities.")
 
     # --- 4. Organize and Visualize the Graph ---
     print("Organizing graph for visualization...")
     
-    # Identify the 75 most connected nodes to visualize.
-    top_nodes = sorted(G.degree, key=lambda x: x[1], reverse=True)[:75]
-    top_nodes_names = [name for name, degree in top_nodes]
-    subgraph = G.subgraph(top_nodes_names)
+    # Identify the 75 most central nodes (by undirected PageRank) to visualize.
+    top_idx = np.argsort(-pagerank, kind='stable')[:75]
+    subgraph = graph.subgraph(top_idx)
     
-    print(f"  -> Visualizing a subgraph of the {len(subgraph.nodes())} most connected nodes.")
+    print(f"  -> Visualizing a subgraph of the {len(subgraph.nodes())} most central nodes.")
 
     # Assign colors and sizes to nodes for better organization
     node_colors = []
@@ -150,7 +411,7 @@ def main():
     nx.draw_networkx_edge_labels(subgraph, pos, edge_labels=edge_labels,
                                 font_color='red', font_size=8)
                                 
-    plt.title("Combined Knowledge Graph (Top 75 Concepts)", size=25)
+    plt.title("Combined Knowledge Graph (Top 75 Concepts by PageRank)", size=25)
     
     # Define the output directory and filename
     output_dir = "knowledge_graph_outputs"
@@ -167,11 +428,20 @@ def main():
     print("Exporting interactive graph JSON for the web UI ...")
     # Convert subgraph into ForceGraph nodes/links structure
     nodes = []
-    for n in subgraph.nodes():
+    for i in top_idx:
+        n = graph.names[i]
+        row = label_degrees.getrow(i)
         nodes.append({
             "id": n,
             "type": subgraph.nodes[n].get('type', 'entity'),
-            "degree": int(subgraph.degree(n))
+            "degree": int(subgraph.degree(n)),
+            "pagerank": float(pagerank[i]),
+            "component": int(components[i]),
+            "community": int(communities[i]),
+            "degree_by_label": {
+                graph.label_names[lab]: int(count)
+                for lab, count in zip(row.indices, row.data)
+            }
         })
 
     links = []
@@ -1,14 +1,22 @@
 import os
 import re
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 import pandas as pd
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Deque, List, Optional, Tuple
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 
 
+logger = logging.getLogger("rag_server")
+
+
 class Paper(BaseModel):
     title: str
     url: Optional[str] = None
@@ -25,6 +33,8 @@ class AnswerResponse(BaseModel):
     query: str
     answer: str
     sources: List[Paper]
+    # Which path produced the answer: "llm", "llm_hedged" or "heuristic"
+    served_by: str = "heuristic"
 
 
 CSV_CANDIDATES = [
@@ -129,70 +139,255 @@ def query(q: str, k: int = 5):
     return {"query": q, "results": results}
 
 
-def synthesize_answer(query_text: str, papers: List[Paper], intent: str = "generic") -> str:
-    # Prefer Gemini if GOOGLE_API_KEY is set
+# Latency budget for /answer. The LLM call runs under ANSWER_DEADLINE_S; once it
+# expires the heuristic answer is served instead. A second (hedged) LLM attempt
+# fires after ANSWER_HEDGE_AFTER_S, or after the observed p95 latency when unset.
+def _env_seconds(name: str, default: Optional[float]) -> Optional[float]:
+    """Read a positive number of seconds from the environment, else `default`."""
+    raw = os.environ.get(name, "").strip()
+    if not raw:
+        return default
+    try:
+        value = float(raw)
+    except ValueError:
+        value = None
+    if value is None or not value > 0 or value == float("inf"):
+        logger.warning("Ignoring invalid %s=%r; using %s", name, raw, default)
+        return default
+    return value
+
+
+ANSWER_DEADLINE_S: float = _env_seconds("ANSWER_DEADLINE_S", 8.0)
+ANSWER_HEDGE_AFTER_S: Optional[float] = _env_seconds("ANSWER_HEDGE_AFTER_S", None)
+ANSWER_HEDGE_ENABLED = os.environ.get("ANSWER_HEDGE", "1").lower() not in ("0", "false", "no")
+
+# Recent LLM latencies, used to derive the p95 hedge threshold. Successful
+# attempts record their latency; an attempt still running at the deadline is
+# recorded as the deadline, so stalls pull the p95 up. Attempts abandoned
+# earlier (e.g. a hedge that lost) and failed attempts are not recorded.
+_LATENCY_WINDOW = 200
+_HEDGE_MIN_SAMPLES = 20
+_llm_latencies: Deque[float] = deque(maxlen=_LATENCY_WINDOW)
+_latency_lock = threading.Lock()
+
+# Stalled calls cannot be interrupted, so they are left to finish on these
+# workers while the request itself returns on time. Each call also carries a
+# client-side timeout so a stalled worker is eventually freed, and no new
+# attempt is queued while every worker is busy.
+_LLM_WORKERS = 8
+_llm_pool = ThreadPoolExecutor(max_workers=_LLM_WORKERS, thread_name_prefix="llm")
+_llm_busy = 0
+_busy_lock = threading.Lock()
+
+
+def _record_latency(seconds: float) -> None:
+    with _latency_lock:
+        _llm_latencies.append(seconds)
+
+
+def _p95_latency() -> Optional[float]:
+    with _latency_lock:
+        samples = sorted(_llm_latencies)
+    if len(samples) < _HEDGE_MIN_SAMPLES:
+        return None
+    return samples[min(len(samples) - 1, int(0.95 * len(samples)))]
+
+
+def _hedge_delay(deadline_s: float) -> Optional[float]:
+    if not ANSWER_HEDGE_ENABLED:
+        return None
+    delay = ANSWER_HEDGE_AFTER_S if ANSWER_HEDGE_AFTER_S is not None else _p95_latency()
+    if delay is None or delay <= 0 or delay >= deadline_s:
+        return None
+    return delay
+
+
+def _gemini_model():
+    """Return a configured Gemini model, or None when no key/SDK is available."""
     g_api_key = os.environ.get("GOOGLE_API_KEY")
-    if g_api_key:
-        try:
-            import google.generativeai as genai
-            genai.configure(api_key=g_api_key)
-            model_name = os.environ.get("GEMINI_MODEL", "gemini-1.5-flash")
-            model = genai.GenerativeModel(model_name)
-            context = "\n\n".join([
-                f"Title: {p.title}\nAbstract: {p.abstract}\nConclusion: {p.conclusion}" for p in papers
-            ])
-            if intent == "yesno":
-                style = (
-                    "Answer YES or NO in one short sentence, then add 2-4 bullets of evidence "
-                    "from the context with study-specific facts."
-                )
-            elif intent == "definition":
-                style = (
-                    "Give a 2-3 sentence definition/summary, then 2-4 bullets with key findings."
-                )
-            elif intent == "compare":
-                style = (
-                    "Give 2-5 contrastive bullets prefixed with A:/B: (or clear labels) comparing the items."
-                )
-            else:
-                style = "Write a concise answer (3-6 bullet points)."
-
-            prompt = (
-                "You are an assistant summarizing NASA bioscience publications. "
-                "Use ONLY the provided context; do not speculate.\n\n"
-                f"Question: {query_text}\n\nContext:\n{context}\n\n"
-                f"Formatting: {style}"
-            )
-            resp = model.generate_content(prompt)
-            if hasattr(resp, "text") and resp.text:
-                return resp.text
-        except Exception:
-            # Fall back to heuristic synthesis below
-            pass
+    if not g_api_key or not _gemini_sdk:
+        return None
+    try:
+        _genai.configure(api_key=g_api_key)
+        model_name = os.environ.get("GEMINI_MODEL", "gemini-1.5-flash")
+        return _genai.GenerativeModel(model_name)
+    except Exception:
+        logger.exception("Could not initialise Gemini model")
+        return None
+
+
+def build_prompt(query_text: str, papers: List[Paper], intent: str = "generic") -> str:
+    context = "\n\n".join([
+        f"Title: {p.title}\nAbstract: {p.abstract}\nConclusion: {p.conclusion}" for p in papers
+    ])
+    if intent == "yesno":
+        style = (
+            "Answer YES or NO in one short sentence, then add 2-4 bullets of evidence "
+            "from the context with study-specific facts."
+        )
+    elif intent == "definition":
+        style = (
+            "Give a 2-3 sentence definition/summary, then 2-4 bullets with key findings."
+        )
+    elif intent == "compare":
+        style = (
+            "Give 2-5 contrastive bullets prefixed with A:/B: (or clear labels) comparing the items."
+        )
+    else:
+        style = "Write a concise answer (3-6 bullet points)."
 
+    return (
+        "You are an assistant summarizing NASA bioscience publications. "
+        "Use ONLY the provided context; do not speculate.\n\n"
+        f"Question: {query_text}\n\nContext:\n{context}\n\n"
+        f"Formatting: {style}"
+    )
+
+
+def _bullet(p: Paper) -> str:
+    snippet = (p.conclusion or p.abstract or "").replace("\n", " ")[:200]
+    return f"• {p.title}: {snippet}"
+
+
+def heuristic_answer(papers: List[Paper], intent: str = "generic") -> str:
     # Heuristic synthesis: stitch abstracts/conclusions
     if not papers:
         return "No matching evidence found in the local corpus."
 
     top = papers[:5]
+    bullets = [_bullet(p) for p in top]
     if intent == "yesno":
         # Heuristic: provide neutral sentence + evidence
         lines = ["Evidence summary (could support YES or NO depending on specifics):"]
-        lines += [f"• {p.title}: {(p.conclusion or p.abstract or '').replace('\n',' ')[:200]}" for p in top]
-        return "\n".join(lines)
+        return "\n".join(lines + bullets)
     elif intent == "definition":
         head = (top[0].abstract or top[0].conclusion or "").split(". ")[:2]
         lead = ". ".join(head)[:240]
-        bullets = [f"• {p.title}: {(p.conclusion or p.abstract or '').replace('\n',' ')[:200]}" for p in top]
         return f"{lead}\n" + "\n".join(bullets)
     elif intent == "compare":
-        bullets = [f"• {p.title}: {(p.conclusion or p.abstract or '').replace('\n',' ')[:200]}" for p in top]
         return "Comparison sources:\n" + "\n".join(bullets)
     else:
-        bullets = [f"• {p.title}: {(p.conclusion or p.abstract or '').replace('\n',' ')[:200]}" for p in top]
         return "Here is a synthesized answer from relevant papers:\n" + "\n".join(bullets)
 
 
+def _timed_generate(model, prompt: str, timeout_s: float) -> Tuple[Optional[str], float]:
+    started = time.monotonic()
+    resp = model.generate_content(prompt, request_options={"timeout": timeout_s})
+    text = getattr(resp, "text", None)
+    return (text or None), time.monotonic() - started
+
+
+def _release_worker(_fut: Future) -> None:
+    global _llm_busy
+    with _busy_lock:
+        _llm_busy -= 1
+
+
+def _try_submit(model, prompt: str, timeout_s: float) -> Optional[Future]:
+    """Start an LLM attempt on an idle worker, or return None if all are busy."""
+    global _llm_busy
+    with _busy_lock:
+        if _llm_busy >= _LLM_WORKERS:
+            return None
+        _llm_busy += 1
+    fut = _llm_pool.submit(_timed_generate, model, prompt, timeout_s)
+    # Runs on completion, failure or cancellation alike.
+    fut.add_done_callback(_release_worker)
+    return fut
+
+
+def _await_within_deadline(model, prompt: str, primary: Future, start: float, deadline_s: float,
+                           hedge_after_s: Optional[float]) -> Tuple[Optional[str], bool]:
+    """
+    Wait for the in-flight LLM call until the deadline, optionally hedging with a
+    second attempt. Returns (text, hedged_attempt_won); text is None if nothing
+    usable arrived in time.
+
+    The hedge only covers slowness: if the primary fails fast (raises or returns
+    empty text) before the hedge point, no second attempt is made.
+    """
+    end = start + deadline_s
+    pending = {primary}
+    started = {primary: start}
+    hedge_at = start + hedge_after_s if hedge_after_s is not None else None
+
+    try:
+        while pending:
+            now = time.monotonic()
+            if now >= end:
+                logger.warning("LLM synthesis exceeded %.2fs deadline; serving heuristic", deadline_s)
+                return None, False
+            wait_until = min(end, hedge_at) if hedge_at is not None else end
+            done, pending = wait(pending, timeout=max(0.0, wait_until - now), return_when=FIRST_COMPLETED)
+            for fut in done:
+                try:
+                    text, elapsed = fut.result()
+                except Exception:
+                    logger.exception("LLM synthesis attempt failed")
+                    continue
+                if text:
+                    _record_latency(elapsed)
+                    return text, fut is not primary
+            if hedge_at is not None and time.monotonic() >= hedge_at:
+                if pending:
+                    hedge = _try_submit(model, prompt, end - time.monotonic())
+                    if hedge is None:
+                        logger.info("No idle LLM worker; skipping hedged attempt")
+                    else:
+                        logger.info("LLM synthesis slower than %.2fs; firing hedged attempt", hedge_after_s)
+                        pending.add(hedge)
+                        started[hedge] = time.monotonic()
+                hedge_at = None
+        return None, False
+    finally:
+        now = time.monotonic()
+        for fut in pending:
+            fut.cancel()
+            # Only a full-deadline stall is a meaningful (censored) sample.
+            if now - started[fut] >= deadline_s:
+                _record_latency(deadline_s)
+
+
+def synthesize_answer(query_text: str, papers: List[Paper], intent: str = "generic",
+                      model=None, deadline_s: Optional[float] = None,
+                      hedge_after_s: Optional[float] = None) -> Tuple[str, str]:
+    """
+    Return (answer, served_by) where served_by is "llm", "llm_hedged" or "heuristic".
+
+    `model` is anything exposing `generate_content(prompt, request_options=...)`
+    with a `.text` result; it defaults to Gemini when GOOGLE_API_KEY is set. The
+    heuristic answer is built while the LLM call is in flight and served if the
+    deadline expires, the call fails, or no LLM worker is idle.
+    """
+    if model is None:
+        model = _gemini_model()
+    if model is None:
+        return heuristic_answer(papers, intent), "heuristic"
+
+    if deadline_s is None:
+        deadline_s = ANSWER_DEADLINE_S
+    elif deadline_s <= 0:
+        logger.warning("Ignoring non-positive deadline_s=%r; using %s", deadline_s, ANSWER_DEADLINE_S)
+        deadline_s = ANSWER_DEADLINE_S
+    if hedge_after_s is None:
+        hedge_after_s = _hedge_delay(deadline_s)
+    elif hedge_after_s <= 0 or hedge_after_s >= deadline_s:
+        hedge_after_s = None
+
+    prompt = build_prompt(query_text, papers, intent)
+    start = time.monotonic()
+    primary = _try_submit(model, prompt, deadline_s)
+    # Computed while the first attempt is already in flight.
+    fallback = heuristic_answer(papers, intent)
+    if primary is None:
+        logger.warning("All LLM workers busy; serving heuristic")
+        return fallback, "heuristic"
+    text, hedged = _await_within_deadline(model, prompt, primary, start, deadline_s, hedge_after_s)
+    if text:
+        return text, "llm_hedged" if hedged else "llm"
+    return fallback, "heuristic"
+
+
 @app.get("/answer", response_model=AnswerResponse)
 def answer(q: str, k: int = 5, intent: str = "generic"):
     qr = query(q=q, k=k)
@@ -202,8 +397,8 @@ def answer(q: str, k: int = 5, intent: str = "generic"):
         q_aug = f"({intent}) {q}"
     else:
         q_aug = q
-    ans = synthesize_answer(q_aug, papers, intent=intent)
-    return {"query": q, "answer": ans, "sources": papers}
+    ans, served_by = synthesize_answer(q_aug, papers, intent=intent)
+    return {"query": q, "answer": ans, "sources": papers, "served_by": served_by}
 
 
 if __name__ == "__main__":
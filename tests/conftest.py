@@ -0,0 +1,9 @@
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# The scripts live at the repo root and rag_server loads paper_summaries.csv
+# relative to the working directory.
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
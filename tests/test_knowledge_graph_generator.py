@@ -0,0 +1,139 @@
+import random
+import time
+
+import networkx as nx
+import numpy as np
+import pytest
+
+import knowledge_graph_generator as kg
+
+
+def make_corpus(num_papers=80, num_entities=200, seed=0):
+    rng = random.Random(seed)
+    entities = [f"entity_{i}" for i in range(num_entities)]
+    predicates = [f"pred_{i}" for i in range(10)]
+    titles = [f"Title of paper number {i}" for i in range(num_papers)]
+    triples = [
+        [(rng.choice(entities), rng.choice(predicates), rng.choice(entities))
+         for _ in range(rng.randint(1, 12))]
+        for _ in range(num_papers)
+    ]
+    # Repeat an (s, o) pair with a new label: the last label must win.
+    triples[0].append((triples[0][0][0], "overwritten", triples[0][0][2]))
+    return titles, triples
+
+
+def build_networkx(titles, triples):
+    # The original per-node construction from main().
+    G = nx.DiGraph()
+    for title, paper_triples in zip(titles, triples):
+        paper_title = f"Paper: {title[:50]}..."
+        G.add_node(paper_title, type='paper')
+        for subj, pred, obj in paper_triples:
+            G.add_node(subj, type='entity')
+            G.add_node(obj, type='entity')
+            G.add_edge(subj, obj, label=pred)
+            G.add_edge(paper_title, subj, label='mentions')
+    return G
+
+
+def graph_from_edges(n, edges):
+    src, dst = zip(*edges)
+    return kg.SparseKnowledgeGraph([str(i) for i in range(n)], [False] * n,
+                                   src, dst, [0] * len(edges), ['rel'])
+
+
+@pytest.fixture(scope="module")
+def graphs():
+    titles, triples = make_corpus()
+    return kg.build_sparse_graph(titles, triples), build_networkx(titles, triples)
+
+
+def test_structure_matches_networkx(graphs):
+    graph, G = graphs
+    assert graph.num_nodes == G.number_of_nodes()
+    assert graph.num_edges == G.number_of_edges()
+    for i, name in enumerate(graph.names):
+        assert ('paper' if graph.is_paper[i] else 'entity') == G.nodes[name]['type']
+    assert list(graph.degree()) == [G.degree(n) for n in graph.names]
+
+    H = graph.subgraph(np.arange(graph.num_nodes))
+    assert nx.get_edge_attributes(H, 'label') == nx.get_edge_attributes(G, 'label')
+    assert 'overwritten' in nx.get_edge_attributes(G, 'label').values()
+
+
+def test_degree_by_label_sums_to_degree(graphs):
+    graph, G = graphs
+    by_label = graph.degree_by_label()
+    assert list(np.asarray(by_label.sum(axis=1)).ravel()) == list(graph.degree())
+    mentions = graph.label_names.index('mentions')
+    for i, name in enumerate(graph.names):
+        expected = sum(1 for e in G.in_edges(name, data='label') if e[2] == 'mentions')
+        expected += sum(1 for e in G.out_edges(name, data='label') if e[2] == 'mentions')
+        assert by_label[i, mentions] == expected
+
+
+@pytest.mark.parametrize("undirected", [False, True])
+def test_pagerank_matches_networkx(graphs, undirected):
+    graph, G = graphs
+    expected = nx.pagerank(G.to_undirected() if undirected else G)
+    ours = graph.pagerank(undirected=undirected)
+    assert ours == pytest.approx([expected[n] for n in graph.names], abs=1e-6)
+
+
+def test_undirected_pagerank_keeps_papers_in_top_nodes(graphs):
+    graph, _ = graphs
+    top = np.argsort(-graph.pagerank(undirected=True), kind='stable')[:75]
+    assert graph.is_paper[top].any()
+
+
+def test_components_match_networkx(graphs):
+    graph, G = graphs
+    assert graph.components().max() + 1 == nx.number_weakly_connected_components(G)
+
+
+def test_communities_split_two_cliques():
+    edges = [(a, b) for a in range(6) for b in range(6) if a < b]
+    edges += [(a + 6, b + 6) for a, b in edges]
+    edges.append((0, 6))
+    communities = graph_from_edges(12, edges).communities()
+    assert len(set(communities[:6])) == 1
+    assert len(set(communities[6:])) == 1
+    assert communities[0] != communities[6]
+
+
+def test_communities_on_path_have_no_singletons():
+    communities = graph_from_edges(50, [(i, i + 1) for i in range(49)]).communities()
+    sizes = np.bincount(communities)
+    assert sizes.min() > 1
+    assert sizes.max() < 50
+
+
+def test_label_propagation_converges_on_bipartite_graph():
+    # Fully synchronous propagation flips labels forever on K(3,3).
+    edges = [(a, b) for a in range(3) for b in range(3, 6)]
+    labels, sweeps, converged = graph_from_edges(6, edges)._label_propagation(100, 0)
+    assert converged
+    assert len(set(labels)) == 1
+
+
+def test_communities_scale_to_large_graphs():
+    # ~300k nodes shaped like the corpus: papers mention entities, entities relate.
+    rng = np.random.default_rng(0)
+    papers, entities = 10_000, 290_000
+    n = papers + entities
+    mention_src = np.repeat(np.arange(papers), 20)
+    mention_dst = papers + rng.integers(0, entities, len(mention_src))
+    rel_src = papers + rng.integers(0, entities, 200_000)
+    rel_dst = papers + rng.integers(0, entities, 200_000)
+    src = np.concatenate([mention_src, rel_src])
+    dst = np.concatenate([mention_dst, rel_dst])
+    graph = kg.SparseKnowledgeGraph([str(i) for i in range(n)], np.arange(n) < papers,
+                                    src, dst, np.zeros(len(src), dtype=np.int64), ['rel'])
+
+    started = time.perf_counter()
+    labels, sweeps, converged = graph._label_propagation(100, 42)
+    elapsed = time.perf_counter() - started
+    assert converged
+    assert sweeps <= 20
+    assert elapsed < 10
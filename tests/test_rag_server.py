@@ -0,0 +1,169 @@
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import rag_server
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    """
+    Stand-in for a Gemini model. Each call consumes the next entry of `delays`
+    (the last one repeats): a number of seconds to sleep, or an Exception to raise.
+    """
+
+    def __init__(self, delays, text="llm answer", release=None):
+        self.delays = list(delays)
+        self.text = text
+        self.release = release or threading.Event()
+        self.calls = 0
+        self.timeouts = []
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, request_options=None):
+        with self._lock:
+            delay = self.delays[min(self.calls, len(self.delays) - 1)]
+            self.calls += 1
+            self.timeouts.append((request_options or {}).get("timeout"))
+        if isinstance(delay, Exception):
+            raise delay
+        # Sleeping on an event lets the fixture free stalled workers at teardown.
+        self.release.wait(delay)
+        return FakeResponse(self.text)
+
+
+PAPERS = [
+    rag_server.Paper(title="Bone loss", abstract="Mice lose bone. In orbit.", conclusion="Osteoclasts\nincrease."),
+]
+
+
+@pytest.fixture
+def release():
+    event = threading.Event()
+    yield event
+    event.set()
+    deadline = time.monotonic() + 5
+    while rag_server._llm_busy and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+@pytest.fixture(autouse=True)
+def no_auto_hedge(monkeypatch):
+    monkeypatch.setattr(rag_server, "ANSWER_HEDGE_ENABLED", False)
+    monkeypatch.setattr(rag_server, "_llm_latencies", rag_server.deque(maxlen=rag_server._LATENCY_WINDOW))
+
+
+def test_fast_model_is_served_by_llm(release):
+    model = FakeModel([0.01], release=release)
+    text, served_by = rag_server.synthesize_answer("q", PAPERS, model=model, deadline_s=1.0)
+    assert (text, served_by) == ("llm answer", "llm")
+    assert model.calls == 1
+    assert model.timeouts == [1.0]
+
+
+def test_stalled_model_falls_back_within_deadline(release):
+    model = FakeModel([10], release=release)
+    started = time.monotonic()
+    text, served_by = rag_server.synthesize_answer("q", PAPERS, model=model, deadline_s=0.2)
+    elapsed = time.monotonic() - started
+    assert served_by == "heuristic"
+    assert text == rag_server.heuristic_answer(PAPERS)
+    assert elapsed < 0.5
+    # The stalled attempt is recorded at the deadline so the p95 sees it.
+    assert list(rag_server._llm_latencies) == [pytest.approx(0.2, abs=0.05)]
+
+
+def test_slow_primary_is_hedged(release):
+    model = FakeModel([10, 0.01], release=release)
+    text, served_by = rag_server.synthesize_answer(
+        "q", PAPERS, model=model, deadline_s=1.0, hedge_after_s=0.1)
+    assert (text, served_by) == ("llm answer", "llm_hedged")
+    assert model.calls == 2
+
+
+@pytest.mark.parametrize("model", [
+    FakeModel([RuntimeError("boom")]),
+    FakeModel([0.0], text=""),
+])
+def test_failed_or_empty_call_falls_back(model):
+    text, served_by = rag_server.synthesize_answer(
+        "q", PAPERS, model=model, deadline_s=1.0, hedge_after_s=0.5)
+    assert (text, served_by) == (rag_server.heuristic_answer(PAPERS), "heuristic")
+    # A fast failure does not trigger the hedge.
+    assert model.calls == 1
+
+
+def test_busy_pool_serves_heuristic_without_queuing(release):
+    stalled = FakeModel([10], release=release)
+    for _ in range(rag_server._LLM_WORKERS):
+        assert rag_server.synthesize_answer("q", PAPERS, model=stalled, deadline_s=0.05)[1] == "heuristic"
+
+    fast = FakeModel([0.0])
+    started = time.monotonic()
+    assert rag_server.synthesize_answer("q", PAPERS, model=fast, deadline_s=1.0)[1] == "heuristic"
+    assert time.monotonic() - started < 0.5
+    assert fast.calls == 0
+
+    release.set()
+    deadline = time.monotonic() + 5
+    while rag_server._llm_busy and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert rag_server.synthesize_answer("q", PAPERS, model=fast, deadline_s=1.0)[1] == "llm"
+
+
+def test_answer_endpoint_reports_served_by(monkeypatch, release):
+    monkeypatch.setattr(rag_server, "_gemini_model", lambda: FakeModel([0.0], release=release))
+    client = TestClient(rag_server.app)
+    body = client.get("/answer", params={"q": "bone loss microgravity"}).json()
+    assert body["served_by"] == "llm"
+    assert body["answer"] == "llm answer"
+
+    monkeypatch.setattr(rag_server, "_gemini_model", lambda: None)
+    body = client.get("/answer", params={"q": "bone loss microgravity"}).json()
+    assert body["served_by"] == "heuristic"
+
+
+def test_p95_threshold_drives_the_hedge(monkeypatch, release):
+    monkeypatch.setattr(rag_server, "ANSWER_HEDGE_ENABLED", True)
+    monkeypatch.setattr(rag_server, "ANSWER_HEDGE_AFTER_S", None)
+    rag_server._llm_latencies.extend([0.1] * rag_server._HEDGE_MIN_SAMPLES)
+    assert rag_server._p95_latency() == pytest.approx(0.1)
+
+    model = FakeModel([10, 0.01], release=release)
+    started = time.monotonic()
+    text, served_by = rag_server.synthesize_answer("q", PAPERS, model=model, deadline_s=1.0)
+    assert served_by == "llm_hedged"
+    assert model.calls == 2
+    assert time.monotonic() - started < 0.5
+    # Only the winning hedge is recorded; the abandoned primary is not.
+    assert len(rag_server._llm_latencies) == rag_server._HEDGE_MIN_SAMPLES + 1
+    assert rag_server._llm_latencies[-1] < 0.1
+
+
+def test_losing_hedge_is_not_recorded_as_a_latency(release):
+    model = FakeModel([0.5, 10], release=release)
+    text, served_by = rag_server.synthesize_answer(
+        "q", PAPERS, model=model, deadline_s=2.0, hedge_after_s=0.45)
+    assert served_by == "llm"
+    assert model.calls == 2
+    assert list(rag_server._llm_latencies) == [pytest.approx(0.5, abs=0.05)]
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("", 8.0), ("3.5", 3.5), ("abc", 8.0), ("0", 8.0), ("-1", 8.0), ("inf", 8.0), ("nan", 8.0),
+])
+def test_env_seconds_falls_back_on_invalid_values(monkeypatch, raw, expected):
+    monkeypatch.setenv("ANSWER_TEST_SECONDS", raw)
+    assert rag_server._env_seconds("ANSWER_TEST_SECONDS", 8.0) == expected
+
+
+def test_non_positive_deadline_uses_default(monkeypatch, release):
+    monkeypatch.setattr(rag_server, "ANSWER_DEADLINE_S", 1.0)
+    model = FakeModel([0.01], release=release)
+    assert rag_server.synthesize_answer("q", PAPERS, model=model, deadline_s=0)[1] == "llm"